@@ -1,33 +1,47 @@
 import os
-from pydantic_settings import BaseSettings
+from dataclasses import dataclass
 from pathlib import Path
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-class Settings(BaseSettings):
+_BASE_DIR = Path(__file__).resolve().parent
+
+@dataclass(frozen=True)
+class Settings:
+    """Application settings.
+
+    A plain frozen dataclass rather than pydantic BaseSettings: none of
+    these fields need validation, and skipping pydantic's import and
+    per-subclass schema build keeps cold start and worker forks fast.
+    Every field can still be overridden through the environment (or the
+    .env file) under its own name, as BaseSettings allowed.
+    """
     # --- File Paths ---
-    BASE_DIR: Path = Path(__file__).resolve().parent
-    PDF_DIR: Path = BASE_DIR / "pdfs"
-    VECTOR_DB_DIR: Path = BASE_DIR / "vector_store"
+    BASE_DIR: Path = _BASE_DIR
+    PDF_DIR: Path = Path(os.environ.get("PDF_DIR", _BASE_DIR / "pdfs"))
+    VECTOR_DB_DIR: Path = Path(os.environ.get("VECTOR_DB_DIR", _BASE_DIR / "vector_store"))
 
     # --- RAG & Embedding ---
-    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
-    CHUNK_SIZE: int = 1000
-    CHUNK_OVERLAP: int = 200
-    
+    EMBEDDING_MODEL: str = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    EMBEDDING_DIM: int = int(os.environ.get("EMBEDDING_DIM", 384))
+    CHUNK_SIZE: int = int(os.environ.get("CHUNK_SIZE", 1000))
+    CHUNK_OVERLAP: int = int(os.environ.get("CHUNK_OVERLAP", 200))
+
     # --- LLM Provider ---
     GROQ_API_KEY: str = os.environ.get("GROQ_API_KEY")
-    LLM_MODEL: str = "llama-3.1-8b-instant"
+    LLM_MODEL: str = os.environ.get("LLM_MODEL", "llama-3.1-8b-instant")
 
     # --- Semantic Cache ---
-    CACHE_COLLECTION_NAME: str = "semantic_cache"
-    SIMILARITY_THRESHOLD: float = 0.95 # Threshold for semantic cache hit
-    
+    CACHE_COLLECTION_NAME: str = os.environ.get("CACHE_COLLECTION_NAME", "semantic_cache")
+    SIMILARITY_THRESHOLD: float = float(os.environ.get("SIMILARITY_THRESHOLD", 0.95)) # Threshold for semantic cache hit
+    MIN_SEMANTIC_QUERY_WORDS: int = int(os.environ.get("MIN_SEMANTIC_QUERY_WORDS", 3))  # Shorter queries skip the L2 lookup
+    CACHE_PERSIST_EVERY: int = int(os.environ.get("CACHE_PERSIST_EVERY", 32))      # L2 writes between snapshots to disk
+
     # --- Short-Term (L1) Cache ---
-    SHORT_TERM_TTL: int = 600    # 10 minutes
-    SHORT_TERM_MAX_SIZE: int = 128 # Max entries in TTL cache
-    
+    SHORT_TERM_TTL: int = int(os.environ.get("SHORT_TERM_TTL", 600))    # 10 minutes
+    SHORT_TERM_MAX_SIZE: int = int(os.environ.get("SHORT_TERM_MAX_SIZE", 128)) # Max entries in TTL cache
+
 # Instantiate settings to be imported by other modules
-settings = Settings()
\ No newline at end of file
+settings = Settings()
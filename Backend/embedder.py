@@ -0,0 +1,90 @@
+import asyncio
+import torch
+from functools import lru_cache
+from typing import Optional
+from sentence_transformers import SentenceTransformer
+
+@lru_cache(maxsize=None)
+def get_embedder(model_name: str) -> SentenceTransformer:
+    """Returns a process-wide shared SentenceTransformer instance.
+
+    Both RAGService and CacheService embed with the same model, so loading
+    it once halves the weight footprint in RAM and the startup time. Uses
+    the GPU when available; FP16 halves memory traffic and roughly doubles
+    throughput on tensor cores with no measurable quality loss.
+    """
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = SentenceTransformer(model_name, device=device)
+    if device == "cuda":
+        model.half()
+    return model
+
+class EmbedderService:
+    """Coalesces concurrent embed requests into batched encode calls.
+
+    A batch-1 forward pass leaves most of the SIMD/GPU width idle. Under
+    concurrent load, queries are accumulated for a few milliseconds and
+    encoded together, so embedding throughput scales with batch size while
+    a lone request still only waits out the short coalescing window.
+    """
+
+    def __init__(self, model_name: str, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.model = get_embedder(model_name)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Starts the batching worker. Must be called from a running event loop."""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancels the batching worker."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def embed(self, text: str):
+        """Returns the normalized embedding for `text`, batched across callers."""
+        if self._worker is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Block for the first item, then drain the queue until the batch
+            # is full or the coalescing window closes.
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = await asyncio.to_thread(
+                    self.model.encode, texts, convert_to_numpy=True, normalize_embeddings=True
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), emb in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(emb)
@@ -9,34 +9,51 @@ PHI_PATTERNS = [
 ]
 
 PROMPT_INJECTION_SIGNATURES = [
-    "ignore previous", "ignore all prior instructions", "do not follow", 
+    "ignore previous", "ignore all prior instructions", "do not follow",
     "bypass", "sudo", "rm -rf", "<script>", "jailbreak", "break out"
 ]
 
+REFUSAL_PHRASES = ["i cannot answer", "i am not qualified", "i am an ai"]
+
+DANGEROUS_KEYWORDS = ["prescribe", "dosage", "dosages", "administer", "injection", "surgery"]
+
 class InputGuardrail:
     """Validates and sanitizes user input."""
     def __init__(self):
-        self.phi_patterns = [re.compile(p, re.IGNORECASE) for p in PHI_PATTERNS]
-        self.injection_signs = [s.lower() for s in PROMPT_INJECTION_SIGNATURES]
+        # Compile each pattern list into a single alternation so validation
+        # scans the input once in C instead of once per pattern in Python.
+        self.injection_re = re.compile(
+            "|".join(re.escape(s) for s in PROMPT_INJECTION_SIGNATURES), re.IGNORECASE
+        )
+        self.phi_re = re.compile(
+            "|".join(f"(?:{p})" for p in PHI_PATTERNS), re.IGNORECASE
+        )
 
     def validate(self, text: str) -> Tuple[bool, str]:
         """
         Returns (True, sanitized_text) on success.
         Returns (False, reason) on failure (e.g., prompt injection).
         """
-        lowered = text.lower()
-        for sig in self.injection_signs:
-            if sig in lowered:
-                return False, f"Rejected input: contains potential injection signature '{sig}'."
+        match = self.injection_re.search(text)
+        if match:
+            return False, f"Rejected input: contains potential injection signature '{match.group(0).lower()}'."
 
-        sanitized = text
         # Redact PHI patterns
-        for pat in self.phi_patterns:
-            sanitized = pat.sub("[REDACTED]", sanitized)
+        sanitized = self.phi_re.sub("[REDACTED]", text)
         return True, sanitized
 
 class OutputGuardrail:
     """Validates the LLM's generated response."""
+    def __init__(self):
+        # Case-insensitive alternations scan the response in place, avoiding
+        # a full lowercased copy of every (potentially multi-KB) LLM response.
+        self.refusal_re = re.compile(
+            "|".join(re.escape(p) for p in REFUSAL_PHRASES), re.IGNORECASE
+        )
+        self.danger_re = re.compile(
+            "|".join(re.escape(k) for k in DANGEROUS_KEYWORDS), re.IGNORECASE
+        )
+
     def validate(self, response: str, context_chunks: List[Dict]) -> Tuple[bool, str]:
         """
         Performs basic checks on the generated output.
@@ -47,19 +64,14 @@ class OutputGuardrail:
         if not response or not response.strip():
             return False, "Empty or null response from model."
 
-        lower = response.lower()
-        
         # Check for refusal phrases
-        refusal_phrases = ["i cannot answer", "i am not qualified", "i am an ai"]
-        if any(phrase in lower for phrase in refusal_phrases):
+        if self.refusal_re.search(response):
             return False, "Model refused to answer the question."
 
         # If the response includes actionable instructions, ensure we have context to back it up.
-        dangerous_keywords = ["prescribe", "dosage", "dosages", "administer", "injection", "surgery"]
-        if any(k in lower for k in dangerous_keywords):
-            if not context_chunks:
-                return False, "Potentially actionable medical instruction was generated without supporting context."
-        
+        if self.danger_re.search(response) and not context_chunks:
+            return False, "Potentially actionable medical instruction was generated without supporting context."
+
         return True, response
 
 class GuardrailService:
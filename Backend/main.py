@@ -1,9 +1,13 @@
 import asyncio
-from fastapi import FastAPI, HTTPException
+import msgspec
+import torch
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from schemas import QueryRequest, QueryResponse, ContextChunk
 from rag import RAGService
 from guardrails import GuardrailService
 from memory import CacheService
+from embedder import EmbedderService
 from config import settings
 
 from contextlib import asynccontextmanager
@@ -13,70 +17,144 @@ async def lifespan(app: FastAPI):
     print("Application startup...")
     if not settings.GROQ_API_KEY:
         raise ValueError("GROQ_API_KEY environment variable not set!")
+    # One torch thread per worker: encoder work already runs in threads,
+    # and intra-op thread pools only add GIL contention at batch sizes
+    # this small.
+    torch.set_num_threads(1)
+    embedder_service.start()
+    # Warm the worker before it accepts traffic: the first encode pays
+    # torch's lazy-init cost and the first searches fault in the HNSW
+    # index pages, which would otherwise land on the first real request.
+    warmup_embedding = rag_service.model.encode(
+        ["warmup"], convert_to_numpy=True, normalize_embeddings=True
+    )[0]
+    rag_service.collection.query(query_embeddings=[warmup_embedding], n_results=1)
+    cache_service.get("warmup query please ignore", embedding=warmup_embedding)
     print("Services initialized successfully.")
     yield
-    # (Optional) Add any shutdown/cleanup logic here
+    await embedder_service.stop()
+    cache_service.persist()
 
 app = FastAPI(
     title="QDOCTOR Clinical Assistant",
     description="An AI agent for mental health professionals using RAG.",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# msgspec handles the /ask request/response round-trip directly, skipping
+# pydantic validation dispatch on the hot path.
+_json_encoder = msgspec.json.Encoder()
+
+def _sse_event(payload) -> str:
+    return f"data: {_json_encoder.encode(payload).decode()}\n\n"
+
+def _sse_single(response: QueryResponse) -> StreamingResponse:
+    """Streams an already-complete response as one token event plus `done`."""
+    async def gen():
+        yield _sse_event({"type": "token", "text": response.answer})
+        yield _sse_event({
+            "type": "done",
+            "was_cached": response.was_cached,
+            "context": msgspec.to_builtins(response.context or [])
+        })
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
 # --- Service Initialization ---
 # These are initialized once at startup and shared across requests.
 rag_service = RAGService()
 guardrail_service = GuardrailService()
 cache_service = CacheService()
+embedder_service = EmbedderService(settings.EMBEDDING_MODEL)
 
-@app.post("/ask", response_model=QueryResponse)
-async def ask_question(request: QueryRequest):
+@app.post("/ask")
+async def ask_question(request: Request, background_tasks: BackgroundTasks):
     """
-    Receives a question, processes it through the RAG pipeline, and returns an answer.
+    Receives a question and streams the answer as server-sent events.
+
+    Events are JSON objects: `{"type": "token", "text": ...}` for each
+    answer fragment, a final `{"type": "done", "was_cached": ..., "context":
+    [...]}` on success, or `{"type": "error", "detail": ...}` on failure.
     """
+    # 0. Decode and validate the body with msgspec.
+    try:
+        query = msgspec.json.decode(await request.body(), type=QueryRequest)
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
     # 1. Input Guardrail: Validate and sanitize the incoming question.
-    is_safe, processed_query = guardrail_service.input_guard.validate(request.question)
+    is_safe, processed_query = guardrail_service.input_guard.validate(query.question)
     if not is_safe:
         raise HTTPException(status_code=400, detail=processed_query)
 
-    # 2. Cache Check: Try to find a similar question in the cache.
-    cached_response = cache_service.get(processed_query)
+    # 2. Fast cache probe: the exact/normalized L1 lookup is a pair of
+    # dict probes, so it runs before any embedding work is spent.
+    cached_response = cache_service.get_exact(processed_query)
     if cached_response:
-        return cached_response
+        return _sse_single(cached_response)
 
-    # 3. Retrieve Context: Get relevant document chunks from the vector store.
-    retrieved_contexts = rag_service.retrieve(processed_query, top_k=request.top_k)
+    # 3. Embed once on the L1 miss: the same vector serves the semantic
+    # cache lookup, retrieval, and the eventual cache write. The embedder
+    # coalesces concurrent requests into a single batched forward pass.
+    query_embedding = await embedder_service.embed(processed_query)
+
+    # 4. Semantic Cache Check: look for a similar question in L2. The
+    # lookup is synchronous CPU/disk work, so it runs in a worker thread
+    # rather than stalling the event loop for other requests.
+    cached_response = await asyncio.to_thread(cache_service.get, processed_query, embedding=query_embedding)
+    if cached_response:
+        return _sse_single(cached_response)
+
+    # 5. Retrieve Context: Get relevant document chunks from the vector store.
+    retrieved_contexts = await asyncio.to_thread(
+        rag_service.retrieve, processed_query, query.top_k, embedding=query_embedding
+    )
     
     if not retrieved_contexts:
         # If no context is found, return a safe, default response.
         fallback_answer = "I could not find relevant information in the knowledge base to answer this question."
         response = QueryResponse(answer=fallback_answer, was_cached=False, context=[])
-        cache_service.set(processed_query, response) # Cache the "not found" response
-        return response
+        # Cache the "not found" response after the response is sent.
+        background_tasks.add_task(cache_service.set, processed_query, response, embedding=query_embedding)
+        return _sse_single(response)
 
-    # 4. Generate Answer: Use the LLM to generate an answer based on the context.
-    try:
-        generated_answer = await rag_service.generate(processed_query, retrieved_contexts)
-    except RuntimeError as e:
-        raise HTTPException(status_code=503, detail=str(e))
+    # 6. Generate and stream: tokens go to the client as the LLM produces
+    # them, so first-token latency isn't blocked by the full completion.
+    # The output guardrail runs on the assembled text once the stream
+    # finishes, and only a clean finish is cached.
+    context_objects = [ContextChunk(**c) for c in retrieved_contexts]
 
-    # 5. Output Guardrail: Validate the generated answer for safety and relevance.
-    is_valid, final_answer = guardrail_service.output_guard.validate(generated_answer, retrieved_contexts)
-    if not is_valid:
-        # If output guardrail fails, provide a safe fallback.
-        final_answer = "The generated response did not pass safety checks. Please try rephrasing your question."
+    async def stream_answer():
+        parts = []
+        try:
+            async for token in rag_service.generate_stream(processed_query, retrieved_contexts):
+                parts.append(token)
+                yield _sse_event({"type": "token", "text": token})
+        except RuntimeError as e:
+            yield _sse_event({"type": "error", "detail": str(e)})
+            return
 
-    # 6. Create and Cache Final Response
-    context_objects = [ContextChunk(**c) for c in retrieved_contexts]
-    final_response = QueryResponse(
-        answer=final_answer, 
-        was_cached=False, 
-        context=context_objects
-    )
-    cache_service.set(processed_query, final_response)
+        is_valid, final_answer = guardrail_service.output_guard.validate("".join(parts), retrieved_contexts)
+        if not is_valid:
+            yield _sse_event({
+                "type": "error",
+                "detail": "The generated response did not pass safety checks. Please try rephrasing your question."
+            })
+            return
+
+        final_response = QueryResponse(answer=final_answer, was_cached=False, context=context_objects)
+        # Cache after the stream completes (BackgroundTasks run once the
+        # StreamingResponse finishes), so neither the write nor a periodic
+        # index snapshot delays the done event.
+        background_tasks.add_task(cache_service.set, processed_query, final_response, embedding=query_embedding)
+        yield _sse_event({
+            "type": "done",
+            "was_cached": False,
+            "context": msgspec.to_builtins(context_objects)
+        })
 
-    return final_response
+    return StreamingResponse(stream_answer(), media_type="text/event-stream")
 
 @app.get("/")
 def read_root():
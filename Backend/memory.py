@@ -1,98 +1,217 @@
-import hashlib
-import json 
+import faiss
+import msgspec
+import os
+import re
+import threading
+import numpy as np
+import orjson
+import xxhash
 from typing import Optional, Tuple, List, Dict
 from cachetools import TTLCache
-from sentence_transformers import SentenceTransformer
-import chromadb
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
 from config import settings
+from embedder import get_embedder
 from schemas import QueryResponse, ContextChunk
 
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
 class CacheService:
     def __init__(self):
         print("Initializing CacheService...")
         # L1 Cache: Fast, in-memory, exact-match cache with a time-to-live
         self.l1_cache = TTLCache(maxsize=settings.SHORT_TERM_MAX_SIZE, ttl=settings.SHORT_TERM_TTL)
-        
-        # L2 Cache: Slower, persistent, semantic-match cache
-        self.model = SentenceTransformer(settings.EMBEDDING_MODEL)
-        self.db_client = chromadb.PersistentClient(path=str(settings.VECTOR_DB_DIR))
-        self.l2_collection = self.db_client.get_or_create_collection(name=settings.CACHE_COLLECTION_NAME)
+
+        # L2 Cache: Persistent, semantic-match cache. An in-process FAISS HNSW
+        # index over unit-norm embeddings (inner product == cosine) with a
+        # parallel entry list; avoids the SQLite transaction commit Chroma
+        # pays on every cache write and its per-query client overhead.
+        # Vectors are scalar-quantized to int8, cutting storage 4x and
+        # letting the dot products run on int8 SIMD; at a 0.95 threshold
+        # the quantization error is far below the decision margin.
+        self.model = get_embedder(settings.EMBEDDING_MODEL)
+        self._index_path = settings.VECTOR_DB_DIR / f"{settings.CACHE_COLLECTION_NAME}.faiss"
+        self._entries_path = settings.VECTOR_DB_DIR / f"{settings.CACHE_COLLECTION_NAME}_entries.json"
+        self.l2_index, self.l2_entries = self._load_l2()
+        self._writes_since_persist = 0
+        # Lookups run in worker threads while writes land via background
+        # tasks. FAISS HNSW does not support add() racing search(), and
+        # TTLCache is not thread-safe either. The two tiers get separate
+        # locks so the cheap L1 probe (which runs on the event loop) never
+        # waits behind L2 maintenance.
+        self._l1_lock = threading.Lock()
+        self._l2_lock = threading.Lock()
+        # Serializes whole snapshots so overlapping persist() calls can't
+        # race each other on the shared temp files.
+        self._persist_lock = threading.Lock()
         print("CacheService initialized.")
 
+    def _new_l2_index(self):
+        """Builds an empty int8-quantized HNSW index ready for inserts."""
+        index = faiss.IndexHNSWSQ(
+            settings.EMBEDDING_DIM, faiss.ScalarQuantizer.QT_8bit_uniform, 32,
+            faiss.METRIC_INNER_PRODUCT
+        )
+        # Unit-norm components always lie in [-1, 1], so training the
+        # uniform quantizer on that fixed range makes it data-independent
+        # and the index usable from the first insert.
+        index.train(np.array(
+            [[-1.0] * settings.EMBEDDING_DIM, [1.0] * settings.EMBEDDING_DIM], dtype=np.float32
+        ))
+        return index
+
+    def _load_l2(self):
+        """Loads the persisted L2 snapshot, or starts fresh.
+
+        The cache is disposable, so a corrupt or half-written snapshot
+        (e.g. the process died mid-write) is discarded rather than being
+        allowed to fail startup or desync the index from its entries.
+        """
+        try:
+            if self._index_path.exists() and self._entries_path.exists():
+                index = faiss.read_index(str(self._index_path))
+                entries = orjson.loads(self._entries_path.read_bytes())
+                if index.ntotal == len(entries):
+                    return index, entries
+                print("Discarding L2 cache snapshot: index and entries are out of step.")
+        except Exception as e:
+            print(f"Discarding unreadable L2 cache snapshot: {e}")
+        return self._new_l2_index(), []
+
     def _make_key(self, text: str) -> str:
-        """Creates a deterministic SHA256 hash for a given text string."""
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+        """Creates a deterministic hash key for a given text string.
+
+        The key never leaves the process, so a SIMD-accelerated
+        non-cryptographic hash is used instead of SHA-256.
+        """
+        return xxhash.xxh3_128_hexdigest(text.encode("utf-8"))
+
+    def _normalize(self, text: str) -> str:
+        """Canonicalizes a query: lowercased, punctuation stripped, tokens sorted.
+
+        Cheap linguistic variants of a cached question ("What is X?",
+        "what is x") then share one L1 key, so they hit before any
+        embedding work is spent on them.
+        """
+        return " ".join(sorted(_PUNCTUATION_RE.sub("", text.lower()).split()))
+
+    def persist(self):
+        """Snapshots the L2 index and its entries to disk.
+
+        Only the in-memory serialization happens under the lock; the disk
+        writes run after releasing it, so lookups never wait on file I/O.
+        Both files are written to temp paths and swapped in with
+        os.replace, so a crash mid-write can never leave a truncated
+        entries file or an index with more rows than entries.
+        """
+        settings.VECTOR_DB_DIR.mkdir(parents=True, exist_ok=True)
+        with self._persist_lock:
+            with self._l2_lock:
+                index_blob = faiss.serialize_index(self.l2_index)
+                entries_blob = orjson.dumps(self.l2_entries)
+                self._writes_since_persist = 0
+
+            index_tmp = self._index_path.with_name(self._index_path.name + ".tmp")
+            entries_tmp = self._entries_path.with_name(self._entries_path.name + ".tmp")
+            index_tmp.write_bytes(bytes(index_blob))
+            entries_tmp.write_bytes(entries_blob)
+            os.replace(index_tmp, self._index_path)
+            os.replace(entries_tmp, self._entries_path)
+
+    def get_exact(self, query: str) -> Optional[QueryResponse]:
+        """Checks only the L1 cache, under the exact and normalized keys.
+
+        A pair of dict probes with no embedding work, so callers can run
+        it before spending an encoder forward pass on the query.
+        """
+        key = self._make_key(query)
+        norm_key = self._make_key(self._normalize(query))
+        with self._l1_lock:
+            cached_l1 = self.l1_cache.get(key) or self.l1_cache.get(norm_key)
+        if cached_l1:
+            print(f"L1 Cache HIT for key: {key[:8]}")
+            return msgspec.convert(cached_l1, QueryResponse)
+        return None
 
-    def get(self, query: str) -> Optional[QueryResponse]:
+    def get(self, query: str, embedding: Optional[List[float]] = None) -> Optional[QueryResponse]:
         """
         Tries to retrieve a response from the cache.
         1. Checks L1 cache for an exact match.
         2. Checks L2 cache for a semantically similar match.
+
+        Pass a precomputed query embedding to skip the encoder forward pass.
         """
-        # --- L1 Cache Check (Exact Match) ---
-        key = self._make_key(query)
-        cached_l1 = self.l1_cache.get(key)
+        # --- L1 Cache Check (Exact or Normalized Match) ---
+        cached_l1 = self.get_exact(query)
         if cached_l1:
-            print(f"L1 Cache HIT for key: {key[:8]}")
-            return QueryResponse(**cached_l1)
+            return cached_l1
 
         # --- L2 Cache Check (Semantic Match) ---
-        query_embedding = self.model.encode([query])[0]
-        
-        results = self.l2_collection.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=1
-        )
-        
-        if results and results['ids'][0]:
-            # Calculate similarity between query and the best match from cache
-            # ChromaDB returns distance, so we can't directly use it as a similarity threshold.
-            # We must fetch the embedding and calculate cosine similarity manually.
-            match_id = results['ids'][0][0]
-            match_data = self.l2_collection.get(ids=[match_id], include=["embeddings", "metadatas"])
-            
-            cached_embedding = np.array(match_data['embeddings'][0])
-            similarity = cosine_similarity([query_embedding], [cached_embedding])[0][0]
-            
-            if similarity >= settings.SIMILARITY_THRESHOLD:
-                print(f"L2 Cache HIT with similarity {similarity:.4f}")
-                cached_answer = match_data['metadatas'][0]['answer']
-                context_json_string = match_data['metadatas'][0].get('context')
-                
-                # Parse the JSON string back into a list of dictionaries
-                if context_json_string:
-                    context_dicts = json.loads(context_json_string)
-                    context_objects = [ContextChunk(**c) for c in context_dicts]
-                else:
-                    context_objects = None
-                
-                response = QueryResponse(answer=cached_answer, was_cached=True, context=context_objects)
-                
-                # Also store this hit in the L1 cache for faster access next time
-                self.l1_cache[key] = response.model_dump()
-                return response
+        # One- or two-word queries almost never clear the similarity
+        # threshold, so they aren't worth an embedding + index search.
+        if len(query.split()) < settings.MIN_SEMANTIC_QUERY_WORDS:
+            print("Cache MISS (query too short for semantic lookup)")
+            return None
+
+        if embedding is None:
+            embedding = self.model.encode([query], normalize_embeddings=True)[0]
+        query_vec = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+
+        entry = None
+        with self._l2_lock:
+            if self.l2_index.ntotal:
+                # Inner product of unit vectors is cosine similarity directly.
+                similarities, indices = self.l2_index.search(query_vec, 1)
+                similarity = float(similarities[0][0])
+                if indices[0][0] >= 0 and similarity >= settings.SIMILARITY_THRESHOLD:
+                    entry = self.l2_entries[indices[0][0]]
+
+        if entry is not None:
+            print(f"L2 Cache HIT with similarity {similarity:.4f}")
+            context_dicts = entry['context']
+            context_objects = [ContextChunk(**c) for c in context_dicts] if context_dicts else None
+
+            response = QueryResponse(answer=entry['answer'], was_cached=True, context=context_objects)
+
+            # Also store this hit in the L1 cache for faster access next
+            # time, under both the exact and normalized keys.
+            dumped = msgspec.to_builtins(response)
+            with self._l1_lock:
+                self.l1_cache[self._make_key(query)] = dumped
+                self.l1_cache[self._make_key(self._normalize(query))] = dumped
+            return response
 
         print("Cache MISS")
         return None
 
-    def set(self, query: str, response: QueryResponse):
-        """Stores a new question-answer pair in both L1 and L2 caches."""
+    def set(self, query: str, response: QueryResponse, embedding: Optional[List[float]] = None):
+        """Stores a new question-answer pair in both L1 and L2 caches.
+
+        Pass a precomputed query embedding to skip the encoder forward pass.
+        """
         key = self._make_key(query)
-        
-        # Store in L1 cache (no change needed here)
-        self.l1_cache[key] = response.model_dump()
+
+        # Store in L1 cache under both the exact and normalized keys so
+        # trivial rephrasings hit without touching the embedder.
+        dumped = msgspec.to_builtins(response)
+        with self._l1_lock:
+            self.l1_cache[key] = dumped
+            self.l1_cache[self._make_key(self._normalize(query))] = dumped
         print(f"Stored in L1 Cache with key: {key[:8]}")
 
         # Store in L2 cache
-        query_embedding = self.model.encode([query])[0].tolist()
-        context_dicts = [c.model_dump() for c in response.context] if response.context else []
-        context_json_string = json.dumps(context_dicts) 
-        
-        self.l2_collection.add(
-            ids=[key],
-            embeddings=[query_embedding],
-            metadatas=[{"query": query, "answer": response.answer, "context": context_json_string}]
-        )
-        print(f"Stored in L2 Cache with key: {key[:8]}")
\ No newline at end of file
+        if embedding is None:
+            embedding = self.model.encode([query], normalize_embeddings=True)[0]
+        context_dicts = msgspec.to_builtins(response.context) if response.context else []
+
+        with self._l2_lock:
+            # The entry must be in place before the index can hand its row
+            # id to a concurrent search.
+            self.l2_entries.append({"query": query, "answer": response.answer, "context": context_dicts})
+            self.l2_index.add(np.asarray(embedding, dtype=np.float32).reshape(1, -1))
+            self._writes_since_persist += 1
+            should_persist = self._writes_since_persist >= settings.CACHE_PERSIST_EVERY
+        print(f"Stored in L2 Cache with key: {key[:8]}")
+
+        # Snapshot to disk periodically rather than on every write.
+        # persist() takes the lock itself, so it runs after releasing ours.
+        if should_persist:
+            self.persist()
@@ -1,44 +1,76 @@
 import chromadb
 import hashlib
 import pdfplumber
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Tuple
-from sentence_transformers import SentenceTransformer
-from groq import Groq
+from groq import AsyncGroq
 import httpx
 from config import settings
+from embedder import get_embedder
+
+def _pdf_to_text(path: Path) -> str:
+    """Extracts text from a single PDF file.
+
+    Module-level so it can be pickled into worker processes during ingestion.
+    """
+    try:
+        with pdfplumber.open(path) as pdf:
+            return "\n\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
+    except Exception as e:
+        print(f"Error reading {path.name}: {e}")
+        return ""
 
 class RAGService:
     def __init__(self):
         print("Initializing RAGService...")
-        self.model = SentenceTransformer(settings.EMBEDDING_MODEL)
-        
+        self.model = get_embedder(settings.EMBEDDING_MODEL)
+
         # Initialize persistent ChromaDB client
         self.db_client = chromadb.PersistentClient(path=str(settings.VECTOR_DB_DIR))
         self.collection = self.db_client.get_or_create_collection(name="documents")
         
         # Initialize Groq client
-        self.groq_client = Groq(api_key=settings.GROQ_API_KEY)
+        self.groq_client = AsyncGroq(api_key=settings.GROQ_API_KEY)
         print("RAGService initialized.")
 
-    def _pdf_to_text(self, path: Path) -> str:
-        """Extracts text from a single PDF file."""
-        try:
-            with pdfplumber.open(path) as pdf:
-                return "\n\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
-        except Exception as e:
-            print(f"Error reading {path.name}: {e}")
-            return ""
-
     def _chunk_text(self, text: str) -> List[str]:
-        """Splits text into overlapping chunks."""
+        """Splits text into chunks on paragraph boundaries.
+
+        Paragraphs are packed greedily up to CHUNK_SIZE so each chunk stays
+        semantically coherent, which improves both embedding quality and
+        downstream cache hit rates. Paragraphs longer than CHUNK_SIZE fall
+        back to fixed-size slices with CHUNK_OVERLAP. The text is split once;
+        everything else is index bookkeeping, so no intermediate copies of a
+        multi-MB document are made beyond the final chunk strings.
+        """
         if not text: return []
         chunks = []
-        start = 0
-        while start < len(text):
-            end = start + settings.CHUNK_SIZE
-            chunks.append(text[start:end])
-            start += settings.CHUNK_SIZE - settings.CHUNK_OVERLAP
+        current = []
+        current_len = 0
+        for para in text.split("\n\n"):
+            if not para: continue
+
+            if len(para) > settings.CHUNK_SIZE:
+                # Oversized paragraph: flush what we have, then hard-slice it.
+                if current:
+                    chunks.append("\n\n".join(current))
+                    current, current_len = [], 0
+                start = 0
+                while start < len(para):
+                    chunks.append(para[start:start + settings.CHUNK_SIZE])
+                    start += settings.CHUNK_SIZE - settings.CHUNK_OVERLAP
+                continue
+
+            # +2 accounts for the paragraph separator when joined.
+            if current and current_len + len(para) + 2 > settings.CHUNK_SIZE:
+                chunks.append("\n\n".join(current))
+                current, current_len = [], 0
+            current.append(para)
+            current_len += len(para) + 2
+
+        if current:
+            chunks.append("\n\n".join(current))
         return chunks
 
     def build_index(self):
@@ -46,22 +78,34 @@ class RAGService:
         print(f"Checking for new PDFs in {settings.PDF_DIR}...")
         pdf_files = list(settings.PDF_DIR.glob("*.pdf"))
         
-        documents_to_add = []
-        for pdf_file in pdf_files:
-            text = self._pdf_to_text(pdf_file)
+        # pdfplumber is CPU-bound and holds the GIL, so extract in worker
+        # processes rather than threads.
+        with ProcessPoolExecutor() as executor:
+            texts = list(executor.map(_pdf_to_text, pdf_files))
+
+        # Collect all candidate chunks first, then resolve which ones already
+        # exist with a single bulk get. One SQLite round-trip instead of one
+        # per chunk, which dominates startup time on the "no new docs" path.
+        candidates = {}
+        for pdf_file, text in zip(pdf_files, texts):
             if not text: continue
-            
+
             chunks = self._chunk_text(text)
             for i, chunk in enumerate(chunks):
                 chunk_id = hashlib.sha1(f"{pdf_file.name}:{i}".encode()).hexdigest()
-                
-                # Check if this chunk ID already exists in the collection
-                if not self.collection.get(ids=[chunk_id])['ids']:
-                    documents_to_add.append({
-                        "id": chunk_id,
-                        "text": chunk,
-                        "metadata": {"source": pdf_file.name}
-                    })
+                candidates[chunk_id] = (pdf_file, chunk)
+
+        existing_ids = set(self.collection.get(ids=list(candidates), include=[])['ids']) if candidates else set()
+
+        documents_to_add = [
+            {
+                "id": chunk_id,
+                "text": chunk,
+                "metadata": {"source": pdf_file.name}
+            }
+            for chunk_id, (pdf_file, chunk) in candidates.items()
+            if chunk_id not in existing_ids
+        ]
 
         if not documents_to_add:
             print("No new documents to index. Vector store is up to date.")
@@ -69,37 +113,51 @@ class RAGService:
 
         print(f"Found {len(documents_to_add)} new chunks to index...")
         
-        texts = [doc['text'] for doc in documents_to_add]
-        embeddings = self.model.encode(texts, convert_to_tensor=False, show_progress_bar=True)
-        
+        chunk_texts = [doc['text'] for doc in documents_to_add]
+        embeddings = self.model.encode(
+            chunk_texts,
+            batch_size=128,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=True
+        )
+
+        # Chroma accepts the ndarray directly; no need to materialize a Python list.
         self.collection.add(
             ids=[doc['id'] for doc in documents_to_add],
-            documents=texts,
-            embeddings=embeddings.tolist(),
+            documents=chunk_texts,
+            embeddings=embeddings,
             metadatas=[doc['metadata'] for doc in documents_to_add]
         )
         print(f"Successfully indexed {len(documents_to_add)} chunks.")
         return len(documents_to_add)
 
-    def retrieve(self, query: str, top_k: int) -> List[Dict]:
-        """Retrieves top_k relevant context chunks from the vector store."""
-        query_embedding = self.model.encode([query], convert_to_tensor=False)[0].tolist()
-        
+    def retrieve(self, query: str, top_k: int, embedding=None) -> List[Dict]:
+        """Retrieves top_k relevant context chunks from the vector store.
+
+        Pass a precomputed query embedding to skip the encoder forward pass.
+        """
+        # Unit-norm embeddings make cosine similarity a plain dot product, so
+        # every stored and query vector is normalized once at encode time.
+        if embedding is None:
+            embedding = self.model.encode([query], convert_to_numpy=True, normalize_embeddings=True)[0]
+
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=[embedding],
             n_results=top_k
         )
         
-        retrieved_chunks = []
-        if results:
-            for i in range(len(results['ids'][0])):
-                retrieved_chunks.append({
-                    "id": results['ids'][0][i],
-                    "text": results['documents'][0][i],
-                    "source": results['metadatas'][0][i]['source'],
-                    "score": 1 - results['distances'][0][i] # Convert distance to similarity score
-                })
-        return retrieved_chunks
+        if not results:
+            return []
+
+        # Chroma returns parallel lists; zip them instead of indexing each
+        # field per row. Distance is converted to a similarity score.
+        return [
+            {"id": chunk_id, "text": text, "source": meta['source'], "score": 1 - distance}
+            for chunk_id, text, meta, distance in zip(
+                results['ids'][0], results['documents'][0], results['metadatas'][0], results['distances'][0]
+            )
+        ]
     
     def _build_prompt(self, contexts: List[dict], question: str) -> Tuple[str, str]:
         """Builds the system and user prompts for the LLM."""
@@ -117,12 +175,16 @@ class RAGService:
         user_prompt = f"**Context Documents:**\n{context_str}\n\n**Question:**\n{question}"
         return system_prompt, user_prompt
 
-    async def generate(self, query: str, context: List[Dict]) -> str:
-        """Generates an answer using the LLM with the provided context."""
+    async def generate_stream(self, query: str, context: List[Dict]):
+        """Streams answer tokens from the LLM as they arrive.
+
+        Yields content deltas; the caller assembles the full answer for
+        guardrail checks and caching once the stream is exhausted.
+        """
         system_prompt, user_prompt = self._build_prompt(context, query)
-        
+
         try:
-            chat_completion = self.groq_client.chat.completions.create(
+            stream = await self.groq_client.chat.completions.create(
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt},
@@ -130,8 +192,12 @@ class RAGService:
                 model=settings.LLM_MODEL,
                 temperature=0.1,  # Lower temperature for more factual responses
                 max_tokens=1024,
+                stream=True,
             )
-            return chat_completion.choices[0].message.content
+            async for chunk in stream:
+                token = chunk.choices[0].delta.content
+                if token:
+                    yield token
         except Exception as e:
             print(f"Error during LLM call: {e}")
             raise RuntimeError(f"Failed to get a response from the LLM provider: {e}")
\ No newline at end of file
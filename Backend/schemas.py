@@ -1,17 +1,21 @@
-from pydantic import BaseModel
+import msgspec
 from typing import List, Optional
 
-class QueryRequest(BaseModel):
+# msgspec Structs instead of pydantic models: the validate + serialize
+# round-trip on the /ask hot path is several times faster, and cached
+# responses convert to/from builtins without pydantic's dispatch.
+
+class QueryRequest(msgspec.Struct):
     question: str
     top_k: int = 3
 
-class ContextChunk(BaseModel):
+class ContextChunk(msgspec.Struct):
     id: str
     text: str
     source: str
     score: float
 
-class QueryResponse(BaseModel):
+class QueryResponse(msgspec.Struct):
     answer: str
     was_cached: bool
-    context: Optional[List[ContextChunk]] = None
\ No newline at end of file
+    context: Optional[List[ContextChunk]] = None